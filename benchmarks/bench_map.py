@@ -0,0 +1,100 @@
+"""
+Benchmark fimport.map against a serial loop.
+
+Builds a small GIL-releasing (f2py ``threadsafe``) routine and times
+calling it over independent batches serially, with thread workers and
+with forked process workers. Usage::
+
+    python benchmarks/bench_map.py [nbatches] [size] [niter]
+
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+import fimport
+
+SOURCE = b"""\
+subroutine work(x, n, niter, a)
+!f2py threadsafe
+integer, intent(in) :: n, niter
+double precision, intent(in) :: x(n)
+double precision, intent(out) :: a
+integer :: i, k
+a = 0
+do k = 1, niter
+   do i = 1, n
+      a = a + sin(x(i) + k)
+   end do
+end do
+end subroutine
+"""
+
+def best_of(func, repeat=3):
+    times = []
+    for j in range(repeat):
+        t0 = time.time()
+        func()
+        times.append(time.time() - t0)
+    return min(times)
+
+def main():
+    nbatches = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    niter = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        fimport.install(build_dir=os.path.join(tmpdir, "_fbld"))
+        sys.path.insert(0, tmpdir)
+        with open(os.path.join(tmpdir, 'fimport_bench_map.f90'), 'wb') as f:
+            f.write(SOURCE)
+        import fimport_bench_map
+        work = fimport_bench_map.work
+
+        batches = [(np.random.rand(size), niter)
+                   for j in range(nbatches)]
+
+        from multiprocessing import cpu_count
+        from multiprocessing.pool import ThreadPool
+
+        print("%d batches of %d doubles, %d iterations, %d cores" % (
+            nbatches, size, niter, cpu_count()))
+        print("%-24s %10s %8s" % ("method", "time [s]", "speedup"))
+
+        serial = best_of(lambda: [work(*args) for args in batches])
+        print("%-24s %10.4f %8.2f" % ("serial loop", serial, 1.0))
+
+        def report(label, func):
+            t = best_of(func)
+            print("%-24s %10.4f %8.2f" % (label, t, serial / t))
+
+        for workers in (1, 2, 4):
+            report("threads, workers=%d" % workers,
+                   lambda: fimport.map(work, batches, workers=workers))
+
+        pool = ThreadPool(4)
+        try:
+            report("threads, reused pool=4",
+                   lambda: fimport.map(work, batches, pool=pool))
+        finally:
+            pool.close()
+            pool.join()
+
+        for workers in (2, 4):
+            report("processes, workers=%d" % workers,
+                   lambda: fimport.map(work, batches, workers=workers,
+                                       processes=True))
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == "__main__":
+    main()
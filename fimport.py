@@ -46,6 +46,43 @@ Extra dependencies can be listed in a <modulename>.fdep::
     some_include.inc
     examplemodule.fbld
 
+Profiling
+---------
+
+Call counts, wall times and array byte volume of the Fortran
+routines can be recorded with::
+
+    fimport.install(profile=True)
+
+    import somefortrancode
+    prof = somefortrancode.__fimport_profile__
+
+or for an already imported module::
+
+    prof = fimport.profile(somefortrancode)
+
+Procedures of Fortran 90 modules are recorded as
+``module.routine``. The statistics are available via ``prof.table()``,
+``prof.as_dict()`` and ``prof.to_json()``. Setting
+``prof.enabled = False`` switches the bookkeeping off at runtime.
+
+Batched calls
+-------------
+
+An f2py routine can be called over many independent batches in
+parallel with::
+
+    results = fimport.map(somefortrancode.routine,
+                          [(x1, y1), (x2, y2), ...], workers=4)
+
+Threads are used by default, which requires the routine to release
+the GIL (``threadsafe`` in the f2py signature). Pass
+``processes=True`` to use a process pool instead; it is forked anew
+on each call, and the results are pickled back to the parent. For
+many small calls, a ``multiprocessing.pool.ThreadPool`` can be
+created once and passed in as ``pool=`` to avoid starting threads
+on every call.
+
 """
 
 # pyximport authors:
@@ -68,9 +105,13 @@ import glob
 import imp
 import time
 import errno
+import json
+import threading
+import warnings
 
 if sys.version_info[0] >= 3:
     from io import StringIO
+    string_types = (str,)
     def reraise(tp, value, tb=None):
         value = tp(value)
         if value.__traceback__ is not tb:
@@ -78,6 +119,7 @@ if sys.version_info[0] >= 3:
         raise value
 else:
     from StringIO import StringIO
+    string_types = (basestring,)
     exec("def reraise(tp, value, tb=None):\n    raise tp, value, tb",
          globals())
 
@@ -366,9 +408,178 @@ def load_module(name, ffilename, fbuild_dir=None):
                 "Building module %s failed: %s" % (
                     name, traceback.format_exception_only(*sys.exc_info()[:2])), 
                 sys.exc_info()[2])
+    if fargs.profile:
+        profile(mod)
     return mod
 
 
+#------------------------------------------------------------------------------
+# Call profiling
+#------------------------------------------------------------------------------
+
+if hasattr(time, 'perf_counter'):
+    _timer = time.perf_counter
+else:
+    _timer = time.time
+
+class Profile(object):
+    """
+    Per-routine call statistics for an imported Fortran module.
+
+    Collects call counts, cumulative/min/max wall time and the number
+    of array bytes passed in, for each instrumented routine. Setting
+    ``enabled = False`` turns the bookkeeping off at runtime; the
+    wrappers then only forward the call.
+    """
+
+    def __init__(self, module, enabled=True):
+        self.module = module
+        self.enabled = enabled
+        self.stats = {}
+        self._originals = {}
+        self._lock = threading.Lock()
+
+    def _record(self, name, elapsed, args, kwargs):
+        nbytes = 0
+        for arg in args:
+            nbytes += getattr(arg, 'nbytes', 0)
+        for arg in kwargs.values():
+            nbytes += getattr(arg, 'nbytes', 0)
+        with self._lock:
+            st = self.stats.get(name)
+            if st is None:
+                self.stats[name] = [1, elapsed, elapsed, elapsed, nbytes]
+            else:
+                st[0] += 1
+                st[1] += elapsed
+                if elapsed < st[2]:
+                    st[2] = elapsed
+                if elapsed > st[3]:
+                    st[3] = elapsed
+                st[4] += nbytes
+
+    def reset(self):
+        """Clear the collected statistics."""
+        with self._lock:
+            self.stats.clear()
+
+    def _instrument(self):
+        # Wrap the routines of the module, and those one level down in
+        # its Fortran 90 module containers. Routines already wrapped are
+        # skipped, so after a reload only the fresh ones get wrapped.
+        mod = self.module
+        for name in dir(mod):
+            obj = getattr(mod, name)
+            if _is_fortran_routine(obj):
+                self._wrap(mod.__dict__, name, name, obj)
+            elif _is_fortran_object(obj):
+                # setattr refuses to overwrite routines of a container,
+                # but lookups go through its __dict__ first
+                members = obj.__dict__
+                for member in list(members):
+                    if _is_fortran_routine(members[member]):
+                        self._wrap(members, member, name + '.' + member,
+                                   members[member])
+        if not self._originals:
+            warnings.warn("fimport.profile: no Fortran routines found in "
+                          "module %s" % (mod.__name__,), RuntimeWarning)
+
+    def _wrap(self, namespace, attr, name, func):
+        self._originals[name] = (namespace, attr, func)
+        namespace[attr] = _profile_wrapper(self, name, func)
+
+    def restore(self):
+        """Put the uninstrumented routines back into the module."""
+        for namespace, attr, func in self._originals.values():
+            if getattr(namespace.get(attr), '_profile', None) is self:
+                namespace[attr] = func
+        self._originals.clear()
+        try:
+            del self.module.__fimport_profile__
+        except AttributeError:
+            pass
+
+    def as_dict(self):
+        """Return the statistics as ``{routine: {field: value}}``."""
+        with self._lock:
+            items = [(name, list(st)) for name, st in self.stats.items()]
+        return dict((name, dict(calls=calls, total=total, min=tmin,
+                                max=tmax, nbytes=nbytes))
+                    for name, (calls, total, tmin, tmax, nbytes) in items)
+
+    def to_json(self, **kw):
+        """Return the statistics as a JSON string."""
+        return json.dumps(self.as_dict(), sort_keys=True, **kw)
+
+    def table(self):
+        """Return the statistics as a text table, slowest first."""
+        stats = sorted(self.as_dict().items(),
+                       key=lambda item: -item[1]['total'])
+        lines = ["%-24s %10s %12s %12s %12s %14s" % (
+            "routine", "calls", "total [s]", "min [s]", "max [s]", "bytes")]
+        for name, st in stats:
+            lines.append("%-24s %10d %12.6f %12.6f %12.6f %14d" % (
+                name, st['calls'], st['total'], st['min'], st['max'],
+                st['nbytes']))
+        return "\n".join(lines)
+
+    def __str__(self):
+        return self.table()
+
+def _is_fortran_object(obj):
+    return type(obj).__name__ == 'fortran'
+
+def _is_fortran_routine(obj):
+    # f2py names routine objects 'function <name>'; Fortran 90 module
+    # and COMMON block containers have no name. (_cpointer can't tell
+    # them apart: a container with a single member has one too.)
+    if not _is_fortran_object(obj):
+        return False
+    name = obj.__dict__.get('__name__')
+    return isinstance(name, string_types) and name.startswith('function ')
+
+def _profile_wrapper(prof, name, func):
+    record = prof._record
+    def wrapper(*args, **kwargs):
+        if not prof.enabled:
+            return func(*args, **kwargs)
+        t0 = _timer()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record(name, _timer() - t0, args, kwargs)
+    wrapper.__name__ = name.split('.')[-1]
+    wrapper.__doc__ = getattr(func, '__doc__', None)
+    wrapper._fortran = func
+    # keep the C pointer visible, for passing the routine as a callback
+    if hasattr(func, '_cpointer'):
+        wrapper._cpointer = func._cpointer
+    wrapper._profile = prof
+    return wrapper
+
+def profile(mod, enabled=None):
+    """Instrument the exported routines of an imported Fortran module.
+
+    Each f2py routine in `mod`, including the procedures of its Fortran
+    90 modules (recorded as ``module.routine``), is replaced by a wrapper
+    recording call counts, timings and argument byte volume. Returns the
+    `Profile` instance for the module.
+
+    Calling this again on the same module returns the existing instance,
+    with any routines replaced since (e.g. by a reload) instrumented
+    anew. ``enabled`` is updated if given, and defaults to True for a
+    new instance.
+    """
+    prof = getattr(mod, '__fimport_profile__', None)
+    if prof is None:
+        prof = Profile(mod, enabled=True)
+        mod.__fimport_profile__ = prof
+    if enabled is not None:
+        prof.enabled = enabled
+    prof._instrument()
+    return prof
+
+
 # import hooks
 
 class FImporter(object):
@@ -463,11 +674,12 @@ class FArgs(object):
     build_dir=True
     reload_support=False
     setup_args={}
+    profile=False
 
 ##fargs=None
 
 def install(fimport=True, build_dir=None,
-            setup_args={}, reload_support=False):
+            setup_args={}, reload_support=False, profile=False):
     """Main entry point. Call this to install the .f import hook in
     your meta-path for a single Python process.  If you want it to be
     installed whenever you use Python, add it to your sitecustomize
@@ -485,6 +697,9 @@ def install(fimport=True, build_dir=None,
     reload(<fmodulename>), e.g. after a change in the Cython code.
     Additional files <so_path>.reloadNN may arise on that account, when
     the previously loaded module file cannot be overwritten.
+
+    ``profile``: Instrument the routines of each imported module
+    for call profiling, see `profile`.
     """
     if not build_dir:
         build_dir = os.path.expanduser('~/.fbld')
@@ -494,6 +709,7 @@ def install(fimport=True, build_dir=None,
     fargs.build_dir = build_dir
     fargs.setup_args = (setup_args or {}).copy()
     fargs.reload_support = reload_support
+    fargs.profile = profile
 
     has_f_importer = False
     for importer in sys.meta_path:
@@ -566,6 +782,99 @@ else:
         def __exit__(self, type, value, traceback):
             pass
 
+#------------------------------------------------------------------------------
+# Batched calls
+#------------------------------------------------------------------------------
+
+_map_routine = None
+_map_batches = None
+_map_lock = threading.Lock()
+
+def _map_call(index):
+    return _map_routine(*_map_batches[index])
+
+def map(routine, batches, workers=None, processes=False, chunksize=None,
+        pool=None):
+    """Call a Fortran routine over independent batches in parallel.
+
+    Each item of `batches` is an argument tuple for `routine` (a
+    non-tuple item is passed as the single argument). The results are
+    returned as a list, in the order of `batches`.
+
+    By default the calls run in a pool of `workers` threads, which
+    gives parallel speedup for routines that release the GIL (f2py
+    ``threadsafe``) and passes arrays to the routine without copying.
+    Starting the thread pool costs about as much as many small calls;
+    when calling repeatedly, pass an existing
+    ``multiprocessing.pool.ThreadPool`` as `pool` to reuse it.
+
+    With ``processes=True`` a forked process pool is used instead, for
+    routines holding the GIL. The workers inherit `batches` from the
+    parent on fork, so the inputs are not copied, but every result is
+    pickled back to the parent. Since the batches are handed over at
+    fork time, a new process pool is forked on each call, and `pool`
+    cannot be used.
+
+    `chunksize` batches are handed to a worker at a time; by default
+    the pool picks it so that each worker gets a few chunks.
+    """
+    global _map_routine, _map_batches
+
+    import multiprocessing
+    from multiprocessing.pool import ThreadPool
+
+    batches = [b if isinstance(b, tuple) else (b,) for b in batches]
+
+    if pool is not None:
+        if processes:
+            raise ValueError("pool cannot be used with processes=True")
+        return pool.map(lambda args: routine(*args), batches,
+                        chunksize=chunksize)
+
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    workers = max(1, min(workers, len(batches)))
+
+    if workers == 1:
+        return [routine(*args) for args in batches]
+
+    if not processes:
+        pool = ThreadPool(workers)
+        try:
+            return pool.map(lambda args: routine(*args), batches,
+                            chunksize=chunksize)
+        finally:
+            pool.close()
+            pool.join()
+
+    if not _IS_POSIX:
+        raise ValueError("processes=True requires fork(), which is not "
+                         "available on this platform")
+
+    if hasattr(multiprocessing, 'get_context'):
+        ctx = multiprocessing.get_context('fork')
+    else:
+        ctx = multiprocessing
+
+    # f2py routines can't be pickled, and pickling the arrays would copy
+    # them: the workers get both from the parent when forked, and are
+    # sent just indices into the batches
+    with _map_lock:
+        _map_routine = routine
+        _map_batches = batches
+        try:
+            pool = ctx.Pool(workers)
+            try:
+                return pool.map(_map_call, range(len(batches)),
+                                chunksize=chunksize)
+            finally:
+                pool.close()
+                pool.join()
+        finally:
+            _map_routine = None
+            _map_batches = None
+
+
 # MAIN
 
 def show_docs():
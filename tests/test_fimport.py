@@ -4,21 +4,36 @@ import tempfile
 import shutil
 import time
 import imp
+import types
+import warnings
+import contextlib
 
-from nose.tools import assert_equal, assert_true
+from nose.tools import assert_equal, assert_true, assert_raises
 
-def test_run():
+@contextlib.contextmanager
+def fimport_env(**install_kw):
+    """Install fimport building into a fresh temporary directory, which
+    is also put on sys.path. Yields ``(fimport, tmpdir)``."""
     old_path = list(sys.path)
+    old_meta_path = list(sys.meta_path)
     tmpdir = tempfile.mkdtemp()
     try:
         sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
 
         import fimport
-        fimport.install(reload_support=True,
-                        build_dir=os.path.join(tmpdir, "_fbld"))
+        fimport.install(build_dir=os.path.join(tmpdir, "_fbld"),
+                        **install_kw)
 
         sys.path.insert(0, tmpdir)
 
+        yield fimport, tmpdir
+    finally:
+        sys.path = old_path
+        sys.meta_path[:] = old_meta_path
+        shutil.rmtree(tmpdir)
+
+def test_run():
+    with fimport_env(reload_support=True) as (fimport, tmpdir):
         test_f90 = os.path.join(tmpdir, 'fimport_test_123.f90')
         test_inc = os.path.join(tmpdir, 'fimport_test_123.inc')
         test_fbld = os.path.join(tmpdir, 'fimport_test_123.fbld')
@@ -64,9 +79,150 @@ def test_run():
             raise AssertionError("Reloading doesn't work currently on Python 3")
         else:
             assert_equal(fimport_test_123.ham(), 1.23)
-    finally:
-        sys.path = old_path
-        shutil.rmtree(tmpdir)
+
+def test_profile():
+    with fimport_env(profile=True) as (fimport, tmpdir):
+        test_f90 = os.path.join(tmpdir, 'fimport_test_prof.f90')
+
+        with open(test_f90, 'wb') as f:
+            f.write(b"subroutine ham(x, n, a)\n"
+                    b"integer, intent(in) :: n\n"
+                    b"double precision, intent(in) :: x(n)\n"
+                    b"double precision, intent(out) :: a\n"
+                    b"a = sum(x)\n"
+                    b"end subroutine\n")
+
+        import numpy as np
+        import fimport_test_prof
+        prof = fimport_test_prof.__fimport_profile__
+        assert_true(fimport.profile(fimport_test_prof) is prof)
+        assert_true(hasattr(fimport_test_prof.ham, '_cpointer'))
+
+        x = np.ones(10)
+        assert_equal(fimport_test_prof.ham(x), 10.0)
+        assert_equal(fimport_test_prof.ham(x), 10.0)
+
+        stats = prof.as_dict()['ham']
+        assert_equal(stats['calls'], 2)
+        assert_equal(stats['nbytes'], 2 * x.nbytes)
+        assert_true(0 <= stats['min'] <= stats['max'] <= stats['total'])
+        assert_true('ham' in prof.table())
+
+        # switched off at runtime
+        prof.enabled = False
+        fimport_test_prof.ham(x)
+        assert_equal(prof.as_dict()['ham']['calls'], 2)
+
+        prof.restore()
+        assert_true(type(fimport_test_prof.ham).__name__ == 'fortran')
+
+        # nothing to instrument
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter('always')
+            prof = fimport.profile(types.ModuleType('fimport_test_empty'))
+        assert_equal(prof.as_dict(), {})
+        assert_equal(len(w), 1)
+        assert_true(issubclass(w[0].category, RuntimeWarning))
+
+def test_profile_modules():
+    with fimport_env(profile=True) as (fimport, tmpdir):
+        test_f90 = os.path.join(tmpdir, 'fimport_test_profmod.f90')
+
+        with open(test_f90, 'wb') as f:
+            f.write(b"module one\n"
+                    b"contains\n"
+                    b"subroutine sub(a)\n"
+                    b"double precision, intent(out) :: a\n"
+                    b"a = 1d0\n"
+                    b"end subroutine\n"
+                    b"end module\n"
+                    b"module several\n"
+                    b"double precision :: val = 2d0\n"
+                    b"contains\n"
+                    b"subroutine foo(a)\n"
+                    b"double precision, intent(out) :: a\n"
+                    b"a = val\n"
+                    b"end subroutine\n"
+                    b"subroutine bar(a)\n"
+                    b"double precision, intent(out) :: a\n"
+                    b"a = 3d0\n"
+                    b"end subroutine\n"
+                    b"end module\n")
+
+        import fimport_test_profmod as mod
+        prof = mod.__fimport_profile__
+
+        # containers are left in place, their procedures instrumented
+        assert_equal(type(mod.one).__name__, 'fortran')
+        assert_equal(mod.one.sub(), 1.0)
+        assert_equal(mod.several.foo(), 2.0)
+        assert_equal(mod.several.bar(), 3.0)
+        mod.several.val = 5
+        assert_equal(mod.several.foo(), 5.0)
+
+        stats = prof.as_dict()
+        assert_equal(sorted(stats), ['one.sub', 'several.bar', 'several.foo'])
+        assert_equal(stats['several.foo']['calls'], 2)
+
+        # routines replaced behind our back (as on reload) are re-wrapped
+        mod.one.__dict__['sub'] = mod.one.sub._fortran
+        assert_true(fimport.profile(mod) is prof)
+        assert_equal(mod.one.sub(), 1.0)
+        assert_equal(prof.as_dict()['one.sub']['calls'], 2)
+
+        prof.restore()
+        assert_equal(type(mod.several.foo).__name__, 'fortran')
+        assert_equal(mod.several.bar(), 3.0)
+
+def test_map():
+    with fimport_env() as (fimport, tmpdir):
+        test_f90 = os.path.join(tmpdir, 'fimport_test_map.f90')
+
+        with open(test_f90, 'wb') as f:
+            f.write(b"subroutine ham(x, n, a)\n"
+                    b"!f2py threadsafe\n"
+                    b"integer, intent(in) :: n\n"
+                    b"double precision, intent(in) :: x(n)\n"
+                    b"double precision, intent(out) :: a\n"
+                    b"a = sum(x)\n"
+                    b"end subroutine\n")
+
+        import numpy as np
+        import fimport_test_map
+
+        batches = [np.arange(float(j)) for j in range(20)]
+        expected = [x.sum() for x in batches]
+
+        assert_equal(fimport.map(fimport_test_map.ham, batches, workers=4),
+                     expected)
+        assert_equal(fimport.map(fimport_test_map.ham, batches, workers=3,
+                                 processes=True, chunksize=4),
+                     expected)
+
+        assert_equal(fimport.map(fimport_test_map.ham, batches, workers=1),
+                     expected)
+        assert_equal(fimport.map(fimport_test_map.ham, [], workers=4), [])
+
+        # explicit argument tuples
+        pairs = [(x, len(x)) for x in batches]
+        assert_equal(fimport.map(fimport_test_map.ham, pairs, workers=4),
+                     expected)
+        assert_equal(fimport.map(fimport_test_map.ham, pairs, workers=2,
+                                 processes=True),
+                     expected)
+
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(2)
+        try:
+            for j in range(3):
+                assert_equal(fimport.map(fimport_test_map.ham, batches,
+                                         pool=pool),
+                             expected)
+            assert_raises(ValueError, fimport.map, fimport_test_map.ham,
+                          batches, processes=True, pool=pool)
+        finally:
+            pool.close()
+            pool.join()
 
 if __name__ == "__main__":
     import nose